@@ -0,0 +1,194 @@
+"""Functionality shared by the ruffwrap modes of operation."""
+
+from __future__ import annotations
+
+import functools
+import os
+import sys
+
+# subprocess and shutil are imported where they are used, so that paths not running a subprocess or
+# searching PATH (e.g. RUFFWRAP_SKIP with RUFFWRAP_EXEC set) don't load them. re is loaded regardless,
+# by shlex when building any Ruff command. typing is only needed for annotations, so it is never loaded.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import re
+    from collections.abc import Callable
+    from types import SimpleNamespace
+    from typing import Self, TextIO
+
+# Ruff arguments showing the settings, including the sentinel tokens, that apply to the files of a directory
+_SENTINEL_PROBE_ARGS = (
+    "check",
+    "--show-settings",
+    "--config",
+    "include = [ '*', '.*' ]",
+    "--config",
+    "exclude = [ '*/*' ]",
+    "--config",
+    "cache-dir = '/dev/null'",
+    "--no-cache",
+)
+
+
+class ModeBase:
+    """
+    Base class for different modes of operation.
+
+    This class serves as a base for different modes of operation. It sets up the
+    initial state of the mode, including the sentinels map, skip flag, and
+    current working directory.
+    """
+
+    def __init__(self: Self, args: SimpleNamespace) -> None:
+        """
+        Initialize the ModeBase class.
+
+        This class serves as a base for different modes of operation. It sets up the
+        initial state of the mode, including the sentinels map, skip flag, and
+        current working directory.
+
+        Args:
+            args (SimpleNamespace): The parsed ruffwrap options.
+        """
+        self._reset()
+        self._sentinels_map = self._get_sentinels_map()
+        self._sentinels_dispatch = {f"s{idx}": func for idx, func in enumerate(self._sentinels_map.values())}
+        self._skip = os.environ.get("RUFFWRAP_SKIP")
+        self._args = args
+        self._initwd = os.getcwd()
+        # When set, output is buffered here as (file, text) pairs instead of being written out
+        self._output: list[tuple[TextIO, str]] | None = None
+
+    def _reset(self: Self) -> None:
+        self._exec = ""
+        # The Ruff command resolved by ruff(), until _exec changes
+        self._resolved_exec: tuple[str, ...] | None = None
+        self._extraargs = {}
+
+    @functools.cached_property
+    def _sentinels_re(self: Self) -> re.Pattern:
+        import re
+
+        # Combine all sentinel patterns into one alternation, one named group per sentinel, so the
+        # Ruff output is scanned once and each match is dispatched on the group that matched.
+        # Compiled on first use, as sentinels aren't processed at all with RUFFWRAP_SKIP.
+        return re.compile(
+            "|".join(f"(?P<s{idx}>{pattern})" for idx, pattern in enumerate(self._sentinels_map)), re.MULTILINE
+        )
+
+    def _get_sentinels_map(self: Self) -> dict[str, Callable[[re.Match], None]]:
+        return {
+            self._sentinel_exec_pattern(): self._sentinel_exec,
+        }
+
+    @staticmethod
+    def _sentinel_exec_pattern() -> str:
+        return r"^[ \t]*__RUFFWRAP_EXEC__(?P<EXEC>.+),$"
+
+    def _sentinel_exec(self: Self, match: re.Match) -> None:
+        self._exec = match.group("EXEC")
+        self._resolved_exec = None
+
+    def _print(self: Self, msg: str, *, file: TextIO) -> None:
+        if self._output is None:
+            print(msg, file=file)
+        else:
+            self._output.append((file, f"{msg}\n"))
+
+    def ruff(self: Self, *cmdargs: str, verbosity_threshold: int = 1, cwd: str | None = None) -> list[str]:
+        """
+        Construct a command array for the Ruff tool.
+
+        This method constructs a command array for the Ruff tool, taking into account
+        the current working directory, verbosity threshold, and any additional command
+        arguments. The command array is constructed from the base command, which is
+        determined by the RUFFWRAP_EXEC environment variable or the default command
+        if RUFFWRAP_SKIP is not set.
+
+        Args:
+            *cmdargs: Variable number of command arguments to be passed to the Ruff tool.
+            verbosity_threshold: The minimum verbosity level required to print the command.
+            cwd: The directory the command will be run in, if not the current working directory.
+                 Shown relative to the initial working directory when printing the command.
+
+        Returns:
+            A list of strings representing the command array.
+        """
+        import shlex
+
+        if self._resolved_exec is None:
+            exec = os.environ.get("RUFFWRAP_EXEC", None) if self._skip else (self._exec or None)
+            if exec is None:
+                import shutil
+
+                exec = shutil.which("ruff")
+                if exec is None:
+                    exec = shutil.which("uvx")
+                    if exec:
+                        exec = exec + " ruff"
+
+            if exec is None:
+                raise FileNotFoundError(f"ruff, uvx not found on PATH")
+            self._resolved_exec = tuple(shlex.split(exec))
+
+        cmd_ary = [*self._resolved_exec, *cmdargs]
+
+        if self._args.verbose >= verbosity_threshold:
+            rel_dir = "." if cwd is None else os.path.relpath(cwd, self._initwd)
+            cwd_rel_str = f"{rel_dir} $ " if rel_dir != "." else ""
+            self._print(f"<<< {cwd_rel_str}{shlex.join(cmd_ary)} >>>", file=sys.stderr)
+        return cmd_ary
+
+    def process_sentinels(self: Self, cwd: str | None = None) -> bool:
+        """
+        Process sentinel tokens from the Ruff tool output.
+
+        This method runs the Ruff tool with specific options to retrieve the list of
+        sentinel tokens. It then parses the output to extract the sentinel tokens and
+        calls the corresponding functions to process them.
+
+        The method first checks if there are any files to process. If not, it returns
+        immediately. Otherwise, it locates the sentinel token header in the output and
+        scans the lines up to the closing bracket in a single pass, calling the
+        corresponding function for each sentinel token found.
+
+        Args:
+            cwd: The directory whose Ruff configuration to process, if not the current working directory.
+
+        Returns:
+            False if there were no files to process and the Ruff settings were not
+            inspected, True otherwise.
+        """
+        import subprocess
+
+        try:
+            result = subprocess.run(
+                self.ruff(*_SENTINEL_PROBE_ARGS, verbosity_threshold=2, cwd=cwd),
+                cwd=cwd,
+                capture_output=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            if b"No files found under the given path" in e.stderr:
+                # No files to process; don't worry about sentinels
+                return False
+            self._print(e.stderr.decode(errors="replace"), file=sys.stderr)
+            raise
+
+        # The settings are left undecoded and searched as bytes for the builtins list, so that only
+        # the list itself is decoded and scanned for sentinel tokens
+        stdout = result.stdout
+        header = b"\nlinter.builtins = [\n"
+        start = stdout.find(header)
+        if start < 0:
+            # no (or an empty) builtins list; there are no sentinel tokens.
+            return True
+        start += len(header)
+        end = stdout.find(b"\n]", start)
+        if end < 0:
+            end = len(stdout)
+
+        # Each line of the builtins list may be a sentinel token; try to match
+        for match in self._sentinels_re.finditer(stdout[start:end].decode()):
+            self._sentinels_dispatch[match.lastgroup](match)  # type: ignore[reportArgumentType]
+        return True
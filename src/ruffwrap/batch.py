@@ -0,0 +1,537 @@
+"""Batch mode of operation: run a sequence of Ruff commands on the passed files."""
+
+from __future__ import annotations
+
+import functools
+import os
+import sys
+import threading
+from collections import defaultdict
+
+from .base import ModeBase
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import re
+    from collections.abc import Callable, Sequence
+    from typing import ClassVar, Self, TextIO
+
+# Ruff configuration files, in Ruff's order of precedence within a directory
+_RUFF_CONFIG_FILENAMES = (".ruff.toml", "ruff.toml", "pyproject.toml")
+
+
+class BatchMode(ModeBase):
+    """
+    Batch mode of the Ruff tool.
+
+    This class extends the :class:`ModeBase` class and provides the batch mode of operation.
+    It processes sentinel tokens from the Ruff tool output if RUFFWRAP_SKIP is not set,
+    and then executes the Ruff tool for each batch mode specific command on the provided paths.
+    """
+
+    # Sentinel processing results (exec, modes), keyed by the Ruff configuration files they came from
+    _sentinel_cache: ClassVar[dict[tuple[tuple[str, int, int], ...], tuple[str, dict[str, list[Sequence[str]]]]]] = {}
+    # One lock per cache key, serializing sentinel processing between concurrently run directories sharing
+    # a configuration, so they wait for the cached result rather than each probing Ruff
+    _sentinel_key_locks: ClassVar[dict[tuple[tuple[str, int, int], ...], threading.Lock]] = {}
+    # Guards _sentinel_key_locks only; never held while probing Ruff
+    _sentinel_key_locks_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def _reset(self: Self) -> None:
+        super()._reset()
+        # Commands of each mode, in order
+        self._modes: dict[str, list[Sequence[str]]] = {}
+        # Commands of each mode by index, as defined by sentinels while they are being processed
+        self._mode_cmds: dict[str, dict[int, Sequence[str]]] = {}
+        self._mode_default_definition_funcs = {
+            "hook": BatchMode._get_hook_mode_default_definition,
+            "hook-fix": BatchMode._get_hook_fix_mode_default_definition,
+            "verify": BatchMode._get_verify_mode_default_definition,
+            "enroll": BatchMode._get_enroll_mode_default_definition,
+        }
+
+    def _get_sentinels_map(self: Self) -> dict[str, Callable[[re.Match], None]]:
+        sentinels_map = super()._get_sentinels_map()
+        sentinels_map.update(
+            {
+                self._sentinel_default_definition_pattern(): self._sentinel_default_definition,
+                self._sentinel_cmd_pattern(): self._sentinel_cmd,
+            }
+        )
+        return sentinels_map
+
+    @staticmethod
+    def _sentinel_cmd_pattern() -> str:
+        # Group names must be unique across all sentinel patterns as they are combined into one regex
+        return r"^[ \t]*__RUFFWRAP_MODE_(?P<CMD_MODE>[a-zA-Z0-9_-]+)_CMD_(?P<IDX>\d+)__(?P<ARGS>.*),$"
+
+    def _sentinel_cmd(self: Self, match: re.Match) -> None:
+        import shlex
+
+        mode = match.group("CMD_MODE")
+        idx = int(match.group("IDX"))
+        args = shlex.split(match.group("ARGS"))
+        if mode not in self._mode_cmds:
+            self._mode_cmds[mode] = {}
+        self._mode_cmds[mode][idx] = args
+
+    @staticmethod
+    def _sentinel_default_definition_pattern() -> str:
+        return r"^[ \t]*__RUFFWRAP_MODE_(?P<DEF_MODE>[a-zA-Z0-9_-]+)_DEFAULT_DEFINITION__,$"
+
+    def _sentinel_default_definition(self: Self, match: re.Match) -> None:
+        mode = match.group("DEF_MODE")
+        def_func = self._mode_default_definition_funcs.get(mode, None)
+        # Default definitions are split once and shared, hence immutable; index them per directory
+        self._mode_cmds[mode] = dict(enumerate(def_func())) if def_func else {}
+
+    def process_sentinels(self: Self, cwd: str | None = None) -> bool:
+        """
+        Process sentinel tokens from the Ruff tool output.
+
+        Extends :meth:`ModeBase.process_sentinels` by putting the commands defined for each mode
+        in order of their index, once all sentinels have been processed.
+
+        Args:
+            cwd: The directory whose Ruff configuration to process, if not the current working directory.
+
+        Returns:
+            False if there were no files to process and the Ruff settings were not
+            inspected, True otherwise.
+        """
+        processed = super().process_sentinels(cwd)
+        self._modes = {mode: [cmd for _, cmd in sorted(cmds.items())] for mode, cmds in self._mode_cmds.items()}
+        return processed
+
+    @staticmethod
+    @functools.cache
+    def _get_hook_mode_default_definition(*, fix_arg: str = "--no-fix") -> tuple[tuple[str, ...], ...]:
+        """Get the default definition for "hook" mode.
+
+        Hook mode is leveraged by git pre-commit hook and developer run-on-save
+        actions. Typical Usage:
+        ruffwrap --verbose --mode=hook <files_changing> 2>&1.
+        """
+        default_definition = [
+            # Start by running the linter on existing code.
+            # The "fix_arg" in the standard version is empty, but see the hook-fix
+            # mode definition below on a version that sets this to " --fix" so that
+            # "ruff check --fix" is used.
+            f"check {fix_arg}",
+            # ...then run the formatter.
+            #
+            # If you want to run either the formatter or the linter or not both, instead of
+            # using the defaults just define the mode directly using one of these two
+            # first commands and nothing else.
+            "format",
+            # The Ruff formatter is not aware of the lint configuration therefore could
+            # induce lint problems, and vice versa. For example, to satisfy its best-
+            # effort line length constraint, the formatter could decide to break up a one-line
+            # function call with a long list of arguments into multiple lines, one line per
+            # argument. noqa's may have been suffixed to the end of the one-line function call
+            # related to the argument list and no longer belong there versus at the end of the
+            # line where the associated argument has moved to. But the formatter doesn't know
+            # about or understand the noqas, and just leaves them in the wrong place. Therefore
+            # to satisfy the linter, some of the noqa comments will need to be moved. We don't
+            # easily know which ones or to where, but the move of some can be decomposed into
+            # deleting all of them then re-adding all of them with the same net result.
+            # This command and the next accomplishes the move in separate steps.
+            #
+            # This 1st of the 2 commands removes all noqas, and is tricky in how it does so.
+            # Specifically it tells ruff to disable all lint rules except RUF100 (unused-noqa),
+            # then to auto-fix those unused-noqa's which ruff satisfies by deleting them.
+            # But by having ALL other lint rules off, all noqas become unused. Therefore the
+            # auto-fix deletes ALL noqas.
+            #
+            # An aside, it is not expected that a failure of this or any remaining commands
+            # should constitute a problem needing the user's attention; i.e. a pre-commit
+            # hook should always return 0 at this point even if the formatter check fails.
+            # Add --quiet switch to most all remaining commands to make them less
+            # chatty and confusing to a user who isn't as aware of all the context.
+            # They will still report problems.
+            "check --fix-only --select RUF100 --quiet",
+            # This 2nd of the 2 commands to move re-formatted noqa's will
+            #  add them all back in again.
+            #
+            # At this point, there will be zero noqas unused (RUF100) or deprecated (RUF101)
+            # even though we are not enabling those linter rules specifically, nor could we without
+            # undesirably introducing noqas for them in some cases due to the formatter.
+            # As far as normal (non-noqa) comments, the formatter will leave them at the same
+            # location relative to whatever normal syntax token they were closest to (like
+            # a colon following an if statement), but not with regard to other comments. This
+            # means that any comments suffixed after a noqa to describe the reason for
+            # the noqa will not move to the noqa's new location. If a noqa does not move, the
+            # deletion of all noqas and readdition will move any comments that were at the right
+            # of the noqa to the left of the noqa. Notably, the formatter ignores line length
+            # restrictions for comments next to noqa lines, so there will be no line length
+            # rule problems as a result so long as the E501 (line-too-long) linter rule is
+            # disabled as per documented ruff formatter recommendations.
+            "check --add-noqa --quiet",
+            # 99.9% of the time, at this point the CI check on formatting and lint should pass.
+            # But in edge cases the last --add-noqa will trigger another format violation.
+            # Therefore, re-run the formatter.
+            "format --quiet",
+            # And then this could trigger lint violations, so re-apply all noqa's by stripping...
+            "check --fix-only --select RUF100 --quiet",
+            # Then readding
+            "check --add-noqa --quiet",
+            # And then here there are even rarer edge cases (ruff bugs?) where another pass
+            # or two or ?infinity of both formatter and linter could be required before checks
+            # run by CI will simultaneously pass. Workaround the instability by having the
+            # pre-commit hook parse the output of these checks. If the instability marker is
+            # found, it needs to embed a flag in the commit message to tell CI to skip its
+            # checking on this commit. The flag needs to be parsed by CI only as applicable
+            # for the commit's root tree SHA in order to skip instances where commit is
+            # cherry-picked or rebased in some way where the process it executed shouldn't
+            # be applied toward deciding to skip CI.
+            "check --exit-zero --no-fix --output-format=json-lines",
+            # Linter can --exit-zero even if issues are found whereas the formatter can't,
+            # so run the linter check first. Reminder that the pre-commit hook should always
+            # return 0 at this point even if the formatter check fails.
+            "format --quiet --check",
+        ]
+
+        import shlex
+
+        return tuple(tuple(shlex.split(cmd_str)) for cmd_str in default_definition)
+
+    @staticmethod
+    def _get_hook_fix_mode_default_definition() -> tuple[tuple[str, ...], ...]:
+        """Get the default definition for "hook-fix" mode.
+
+        Hook-fix mode can be leveraged by git pre-commit hook actions. Strongly
+        discouraged for use as a developer ruff-on-save hook, see below comments
+        Typical Usage:
+        ruffwrap --verbose --mode=hook-fix <files_changing> 2>&1
+        """
+        # The idea of an initial "ruff check --fix" is a nice developer perk for auto-fixing
+        # issues on explicit developer action e.g. git commit when run by a pre-commit hook.
+        # But when used as a developer ruff-on-save action, it can cause loss of work.
+        # For example, the autofix for F841 (unused-variable) is to remove the variable
+        # assignment, so if run as part of a ruff-on-save hook and the developer saves
+        # between writing the line assigning the variable but before using the variable,
+        # or typoes either the variable assignment or reference, the autofix will immediately
+        # and silently remove the assignment, at best irritating and perhaps bewildering
+        # the developer. Therefore leveraging --hook-fix as a developer ruff-on-save hook
+        # is strongly discouraged.
+        return BatchMode._get_hook_mode_default_definition(fix_arg="--fix")
+
+    @staticmethod
+    @functools.cache
+    def _get_verify_mode_default_definition() -> tuple[tuple[str, ...], ...]:
+        """Get the default definition for "verify" mode.
+
+        Verify mode is leveraged by CI, and is intended to confirm neither the linter
+        nor the formatter find any unexcepted problems with the files that are changing.
+        Typical Usage:
+        set -xe
+        if [[ -z "$skip_ruffwrap_check" ]]; then
+            set -o pipefail
+            git diff --cached --name-only -z | xargs -0 bash -c 'ruffwrap --verbose --mode=verify "$@" 2>&1'
+        else
+            echo "skip_ruffwrap_check reason: $skip_ruffwrap_check"
+        fi
+        """
+        default_definition = [
+            "check --no-fix --no-cache --config \"cache-dir = '/dev/null'\"",
+            "format --check --no-cache --config \"cache-dir = '/dev/null'\"",
+        ]
+        import shlex
+
+        return tuple(tuple(shlex.split(cmd_str)) for cmd_str in default_definition)
+
+    @staticmethod
+    @functools.cache
+    def _get_enroll_mode_default_definition() -> tuple[tuple[str, ...], ...]:
+        """Get the default definition for "verify" mode.
+
+        Enroll mode is used to initially enroll a legacy codebase, or to re-enroll a codebase
+        after a Ruff upgrade generates differences in linting or formatting.
+        Typical Usage (from submodule root, after updating RUFFWRAP_EXEC to new version in Ruff configuration):
+        - git ls-files -z --recurse-submodules | xargs -0 bash -c 'ruff --ruffwrap-verbose --ruffwrap-mode=enroll "$@" 2>&1'
+        - git add -u && git commit
+        - git rev-parse HEAD >> .git-blame-ignore-revs; git add .git-blame-ignore-revs && git commit
+        - git push origin HEAD~1:refs/for/<branch> && git commit origin HEAD:refs/for/<branch>
+        - verify and submit
+        - Repeat for all active branches (i.e. with potential merge/cherry-pick needs)
+        """
+        # While unlikely on modern day linux, it's possible with the git ls-files command to exceed the maximum
+        # command line argument length. A command to verify would be to run the below command and confirm it does
+        # not approach the value returned by "getconf ARG_MAX" (typically 2097152 characters)
+        # git ls-files -z --recurse-submodules | wc -c
+
+        default_definition = [
+            # In the hook modes, it's better to run the check first, before the format, to
+            # get lint failure feedback to the user before messing with the file format.
+            # But with enrollment which is expected to do whatever is necessary to get the
+            # linter and formatter not complaining, it's more efficient to format first
+            # before involving the linter.
+            "format",
+            # --add-noqa in the next step would ordinarily add a noqa for
+            # PLR2044 (empty-comment) for any empty comments at the end of python
+            # statements. But it was observed that with that noqa, Ruff no longer
+            # sees the line as having a empty comment, removing the need for it
+            # and causing it to be stripped in later steps, which reinduces the
+            # empty-comment problem seen by the linter. Therefore explicitly fix this
+            # particular issue instead of exempting it with noqa. This seems like
+            # a workaround to a Ruff bug, should be checked if still necessary in
+            # later Ruff releases.
+            "check --fix-only --select PLR2044 --quiet",
+            # Add noqas for all known configured issues per the current version of Ruff
+            "check --add-noqa",
+            # Doing this may have induced format problems, so re-run the formatter.
+            # Add --quiet switch to all remaining commands to make them less
+            # chatty. They will still report problems.
+            "format --quiet",
+            # Formatting may induced, solved, or moved linter problems, so strip
+            # all noqas via the RUF100 autofix trick...
+            "check --fix-only --select RUF100 --quiet",
+            # then readd them all again.
+            "check --add-noqa --quiet",
+            # Doing this may have (again) induced format problems, so re-run the formatter
+            "format --quiet",
+            # Very unlikely, but formatting may induced some more issues. Just try to add
+            # more noqas.
+            "check --add-noqa --quiet",
+            # More noqas could trigger another re-format need
+            "format --quiet",
+            # Hopefully that didn't trigger any linter failures.  If this fails, re-run
+            # this mode a few times to hopefully fix. If that doesn't work, there is
+            # probably a ruff bug involved and it will likely be required to fix or
+            # some linter issues or perhaps manually reformat to enroll.
+            "check --no-fix --quiet",
+        ]
+        import shlex
+
+        return tuple(tuple(shlex.split(cmd_str)) for cmd_str in default_definition)
+
+    @staticmethod
+    def _get_sentinel_cache_key(abs_dir_path: str) -> tuple[tuple[str, int, int], ...]:
+        """Identify the Ruff configuration governing a directory.
+
+        Ruff takes the configuration of a directory from the closest directory at or above
+        it holding a configuration file, so directories sharing that closest directory share
+        the same sentinels. The key is the path, mtime and size of each configuration file
+        found there, or empty if none is found (user-level or default configuration).
+        """
+        dir_path = os.path.normpath(abs_dir_path)
+        while True:
+            key = []
+            for filename in _RUFF_CONFIG_FILENAMES:
+                config_path = os.path.join(dir_path, filename)
+                try:
+                    stat = os.stat(config_path)
+                except OSError:
+                    continue
+                key.append((config_path, stat.st_mtime_ns, stat.st_size))
+            if key:
+                return tuple(key)
+            parent_path = os.path.dirname(dir_path)
+            if parent_path == dir_path:
+                return ()
+            dir_path = parent_path
+
+    def _load_sentinels(self: Self, abs_dir_path: str) -> None:
+        """Process sentinel tokens for a directory, reusing the results of a directory sharing its configuration."""
+        self._reset()
+        key = self._get_sentinel_cache_key(abs_dir_path)
+        with self._sentinel_key_locks_lock:
+            key_lock = self._sentinel_key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = self._sentinel_cache.get(key)
+            if cached is not None:
+                self._exec, self._modes = cached
+            elif self.process_sentinels(abs_dir_path):
+                # Only cache if Ruff settings were inspected; the "no files" outcome is specific to the directory
+                self._sentinel_cache[key] = (self._exec, self._modes)
+
+    def _get_files_by_depth(self: Self, paths: list[str]) -> dict[int, dict[str, frozenset[str]]]:
+        files_by_depth: dict[int, dict[str, list[str]]] = defaultdict(lambda: defaultdict(list))
+        # The working directory doesn't change, so resolve paths against it with string operations
+        # rather than os.path.abspath/relpath, which each query the working directory again.
+        initwd_prefix = os.path.join(self._initwd, "")
+        for path in paths:
+            if os.path.isdir(path):
+                continue
+            abspath = os.path.normpath(os.path.join(self._initwd, path))
+            abs_dir = os.path.dirname(abspath)
+            if abs_dir == self._initwd:
+                file_dir = "."
+            elif abs_dir.startswith(initwd_prefix):
+                file_dir = abs_dir[len(initwd_prefix) :]
+            else:
+                file_dir = os.path.relpath(abs_dir, self._initwd)
+            # file_dir is built from os.path results, so it uses the platform's separator
+            depth = file_dir.count(os.sep)
+            files_by_depth[depth][file_dir].append(abspath)
+        # Freeze each directory's files once; they are only tested for membership from here on, possibly
+        # from several threads
+        return {
+            depth: {file_dir: frozenset(abs_paths) for file_dir, abs_paths in dir_info.items()}
+            for depth, dir_info in files_by_depth.items()
+        }
+
+    def _get_paths_from_args(self, args: list[str]) -> tuple[bool, list[str]]:
+        """Return path list from argument list."""
+        if "--" not in args:
+            # "--" not in the arglist; assume they are all paths.
+            return True, args
+        if (filelist_delim := args.index("--")) > 0:
+            return False, args[0:filelist_delim]
+        return True, args[(1 + filelist_delim) :]
+
+    def run(self: Self, args: list[str]) -> int:
+        """
+        Run the batch mode of the ruff tool.
+
+        This method processes sentinel tokens from the ruff tool output if RUFFWRAP_SKIP is not set.
+        It then executes the ruff tool with the provided paths and mode-specific commands.
+
+        Args:
+            args: Generally a list of file paths to be processed by the ruff tool.
+                  If a "--" is passed, any prior args are flagged as an error.
+        Returns:
+            An integer representing the exit status of the ruff tool execution.
+        """
+        if self._skip:
+            return 0
+
+        paths_are_good, paths = self._get_paths_from_args(args)
+        if not paths_are_good:
+            print(f"bad {self._args.mode} mode args, failing (exit code 3): {paths}", file=sys.stderr)
+            return 3
+
+        # iterate over files in reverse order of depth
+        dir_items = [
+            dir_item
+            for _, dir_info in sorted(self._get_files_by_depth(paths).items(), reverse=True)
+            for dir_item in dir_info.items()
+        ]
+        if len(dir_items) <= 1:
+            return max((self._run_one_dir(*dir_item) for dir_item in dir_items), default=0)
+
+        # Directories are independent of each other, so run them concurrently. Their output is
+        # buffered and replayed in the above order so it isn't interleaved; unlike a serial run,
+        # Ruff's output is then captured rather than written to the terminal (see _check_call).
+        returncode = 0
+        outputs = [[] for _ in dir_items]
+        stop = threading.Event()
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(len(dir_items), os.cpu_count() or 1)) as executor:
+            futures = [
+                executor.submit(self._run_one_dir_buffered, output, *dir_item, stop=stop)
+                for output, dir_item in zip(outputs, dir_items, strict=True)
+            ]
+            replayed = 0
+            try:
+                for output, future in zip(outputs, futures, strict=True):
+                    try:
+                        returncode = max(future.result(), returncode)
+                    finally:
+                        replayed += 1
+                        self._replay(output)
+            except BaseException:
+                # As a serial run would, stop at the failure: don't start any further directories, but let
+                # those already started finish their commands and show their output before re-raising
+                stop.set()
+                executor.shutdown(cancel_futures=True)
+                for output, future in zip(outputs[replayed:], futures[replayed:], strict=True):
+                    if not future.cancelled():
+                        self._replay(output)
+                raise
+
+        return returncode
+
+    @staticmethod
+    def _replay(output: list[tuple[TextIO, str]]) -> None:
+        """Write out output buffered by a directory run."""
+        for file, text in output:
+            file.write(text)
+            file.flush()
+
+    def _run_one_dir_buffered(
+        self: Self, output: list[tuple[TextIO, str]], dir_path: str, abs_paths: frozenset[str], *, stop: threading.Event
+    ) -> int:
+        """
+        Run a directory on its own instance, buffering its output into the given list.
+
+        The directory is skipped if the stop event is already set when it is due to start. Once started,
+        it always runs its whole command sequence, as stopping partway could leave its files half-processed.
+        """
+        if stop.is_set():
+            return 0
+        worker = BatchMode(self._args)
+        worker._output = output
+        return worker._run_one_dir(dir_path, abs_paths)
+
+    def _run_one_dir(self: Self, dir_path: str, abs_paths: frozenset[str]) -> int:
+        """Run the mode commands on the given files of a directory, returning the exit status."""
+        abs_dir_path = f"{self._initwd}/{dir_path}"
+        self._load_sentinels(abs_dir_path)
+
+        if self._args.mode not in self._modes:
+            if self._args.mode_require:
+                self._print(
+                    f'{abs_dir_path}: mode "{self._args.mode}" undefined; mode-require set, failing (exit code 1)',
+                    file=sys.stderr,
+                )
+                return 1
+            return 0
+
+        import subprocess
+
+        # Get the files that need to be checked from ruff, filtering its listing of the whole
+        # subtree as it streams in rather than buffering it, unless output is being buffered anyway
+        cmd = self.ruff("check", "--show-files", verbosity_threshold=2, cwd=abs_dir_path)
+        stderr_pipe = None if self._output is None else subprocess.PIPE
+        with subprocess.Popen(
+            cmd, cwd=abs_dir_path, stdout=subprocess.PIPE, stderr=stderr_pipe, encoding="utf-8"
+        ) as proc:
+            if self._output is None:
+                lines = proc.stdout
+            else:
+                # Read both pipes together, so that a lot of stderr output can't stall the listing
+                stdout, stderr = proc.communicate()
+                self._output.append((sys.stderr, stderr))
+                lines = stdout.splitlines()
+            paths = [
+                os.path.basename(file)
+                for line in lines  # type: ignore[reportOptionalIterable]
+                if (file := line.rstrip("\n")) in abs_paths
+            ]
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+        if not paths:
+            return 0
+
+        mode = self._modes[self._args.mode]
+
+        # Each command runs as its own Ruff process, in order and stopping at the first failure, since
+        # later commands must see the files as rewritten by earlier ones. Ruff can't run more than one
+        # command per invocation, so chaining them through a shell would only add a shell process.
+        try:
+            for cmd in mode:
+                self._check_call(self.ruff(*cmd, *paths, cwd=abs_dir_path), cwd=abs_dir_path)
+        except subprocess.CalledProcessError as e:
+            self._print(str(e), file=sys.stderr)
+            return e.returncode
+        return 0
+
+    def _check_call(self: Self, cmd: list[str], *, cwd: str) -> None:
+        """
+        Run a Ruff command, raising CalledProcessError if it fails.
+
+        When output is buffered, the command's stdout and stderr are captured and buffered one after
+        the other, so Ruff isn't writing to a terminal: its output isn't coloured or shown live.
+        """
+        import subprocess
+
+        if self._output is None:
+            subprocess.check_call(cmd, cwd=cwd)
+            return
+        result = subprocess.run(cmd, cwd=cwd, text=True, capture_output=True, check=False)
+        self._output.extend(((sys.stdout, result.stdout), (sys.stderr, result.stderr)))
+        if result.returncode:
+            raise subprocess.CalledProcessError(result.returncode, cmd)
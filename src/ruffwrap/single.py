@@ -0,0 +1,50 @@
+"""Single mode of operation: execute Ruff with the passthrough arguments."""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from .base import ModeBase
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Self
+
+
+class SingleMode(ModeBase):
+    """
+    SingleMode mode of the Ruff tool.
+
+    This class extends the :class:`ModeBase` class and provides the Single mode of operation.
+    It processes sentinel tokens from the Ruff tool output if RUFFWRAP_SKIP is not set,
+    and then executes the Ruff tool with the provided passthrough arguments.
+    """
+
+    def run(self: Self, passthrough_args: list[str]) -> int:
+        """
+        Run the Single mode of the ruffwrap tool.
+
+        This method processes sentinel tokens from the Ruff tool output if RUFFWRAP_SKIP is not set.
+        It then executes the Ruff tool with the provided passthrough arguments.
+
+        Args:
+            passthrough_args: A list of command arguments to be passed to the Ruff tool.
+
+        Returns:
+            An integer representing the exit status of the Ruff tool execution.
+        """
+        if not self._skip:
+            self.process_sentinels()
+        try:
+            execargs = self.ruff(*passthrough_args)
+            if os.path.isabs(execargs[0]):
+                # e.g. resolved by shutil.which; no need to search PATH again
+                os.execv(execargs[0], execargs)
+            else:
+                os.execvp(execargs[0], execargs)
+        except OSError as e:
+            msg = f"Error executing {execargs}: {e}"
+            print(msg, file=sys.stderr)
+            return 200
+        # unreachable due to successful exec